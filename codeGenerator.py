@@ -0,0 +1,100 @@
+from activationFunctions import identityActivation, zeroOneActivation, \
+    sigmoidActivation, arctanActivation
+from networkExceptions import UnsupportedActivationException
+from network import Perceptron, BiasNode
+
+"""Generates standalone Python predictors for small networks. The generated
+module contains one flat function with the weights inlined as constants and
+every node computed in topological order, so calling it skips all of the
+NetworkHarness and Node machinery. It only imports from the math module. For
+example,
+    writePredictor(net, 'cupPredictor.py')
+and later, with no dependency on this package,
+    from cupPredictor import predict
+    predict([-0.2, 4.3, 1.2, -0.4])
+returns the same label as net.run([-0.2, 4.3, 1.2, -0.4]). Note that the
+weights are copied when the code is generated, so the predictor must be
+regenerated after further training."""
+
+# Expressions matching each activation function in activationFunctions.py
+ACTIVATION_TEMPLATES = {
+    identityActivation: '{0}',
+    zeroOneActivation: 'int({0} >= 0)',
+    sigmoidActivation: '(1 + exp(-1 * {0})) ** -1',
+    arctanActivation: 'atan({0})/pi + 0.5'
+}
+
+def activationExpression(function, argument):
+    """Returns the source for function applied to the expression argument."""
+    if function not in ACTIVATION_TEMPLATES:
+        raise UnsupportedActivationException(function)
+    return ACTIVATION_TEMPLATES[function].format(argument)
+
+def floatLiteral(value):
+    """Returns a source literal for a weight, including infinities and NaN."""
+    if value != value or value in [float('inf'), float('-inf')]:
+        return "float('" + repr(float(value)) + "')"
+    return repr(value)
+
+def generatePredictor(network, functionName='predict'):
+    """Returns the source of a module defining functionName(data), which
+    returns the same label as network.run(data)."""
+    # Only nodes that some output depends on need to be computed
+    needed = set(network.outputLayer) | set(network.inputLayer)
+    stack = list(network.outputLayer)
+    while len(stack) > 0:
+        for parent in stack.pop().inputs:
+            if parent not in needed and not isinstance(parent, BiasNode):
+                needed.add(parent)
+                stack.append(parent)
+    order = [node for node in network.topologicalOrder() if node in needed]
+    names = {node: 'v' + str(i) for i, node in enumerate(order)}
+    numInputs = len(network.inputLayer)
+    lines = [
+        '"""Predictor generated from a neural-nets Network. Do not edit."""',
+        'from math import exp, atan, pi',
+        '',
+        'LABELS = ' + repr(list(network.validLabels)),
+        '',
+        'def ' + functionName + '(data):',
+        '    """Returns the predicted label for a list of '
+            + str(numInputs) + ' inputs."""',
+        '    if len(data) != ' + str(numInputs) + ':',
+        '        raise ValueError("Incorrect number of inputs: expected '
+            + str(numInputs) + ', received " + str(len(data)))'
+    ]
+    for i, node in enumerate(network.inputLayer):
+        expression = activationExpression(node.activationFunc,
+            'data[' + str(i) + ']')
+        lines.append('    ' + names[node] + ' = ' + expression + '  # '
+            + node.index)
+    for node in order[numInputs:]:
+        # Sum in the same order as Node.getWeightedInputSum so that results
+        # match the network exactly.
+        terms = ['0.0']
+        for parent in node.inputs:
+            if isinstance(parent, BiasNode):
+                source = floatLiteral(parent.value)
+            else:
+                source = names[parent]
+            terms.append(source + ' * ' + floatLiteral(node.weights[parent]))
+        expression = activationExpression(node.activationFunc,
+            '(' + ' + '.join(terms) + ')')
+        lines.append('    ' + names[node] + ' = ' + expression + '  # '
+            + node.index)
+    scores = '[' + ', '.join(names[node] for node in network.outputLayer) + ']'
+    if isinstance(network, Perceptron):
+        lines.append('    return str(' + scores + '[0])')
+    else:
+        lines += [
+            '    exponentials = [exp(s) for s in ' + scores + ']',
+            '    total = sum(exponentials)',
+            '    softmaxScores = [x/total for x in exponentials]',
+            '    return LABELS[softmaxScores.index(max(softmaxScores))]'
+        ]
+    return '\n'.join(lines) + '\n'
+
+def writePredictor(network, filename, functionName='predict'):
+    """Writes the predictor module for network to filename."""
+    with open(filename, 'w') as f:
+        f.write(generatePredictor(network, functionName))
@@ -0,0 +1,104 @@
+from network import Perceptron
+from train import readDataFile, trainOnSamples, trainPerceptronOnSamples, \
+    countCorrect
+from networkExceptions import ValidationError
+from multiprocessing import get_context, get_all_start_methods
+from random import Random
+from statistics import mean, pstdev
+import time
+
+"""K-fold cross-validation. The data file is read and partitioned once, and
+each fold trains a fresh network (from a factory function) on the other k - 1
+folds and validates it on its own fold. Folds run concurrently in a pool of
+worker processes. For example, to compare hidden layer sizes,
+    for size in [2, 4, 8]:
+        results = crossValidate(lambda: Network(2, [size], 4,
+            validLabels=labels), inverseTimeLearningRate(1), 'train.txt')
+Workers are forked so that the factory and learning rate function (which are
+usually closures) need not be picklable; on platforms without fork, the folds
+run one after another in the current process."""
+
+FOLD_JOB = None  # (samples, folds, factory, rate function, optimizer factory)
+
+def partition(numSamples, k, seed=None):
+    """Splits the indices 0, ..., numSamples - 1 into k folds of nearly equal
+    size. The indices are shuffled first if a seed is given; otherwise, each
+    fold is a contiguous block. Raises a ValidationError unless
+    2 <= k <= numSamples, so that no fold is empty."""
+    if k < 2 or k > numSamples:
+        raise ValidationError("Cannot split " + str(numSamples)
+            + " samples into " + str(k) + " folds: need 2 <= k <= "
+            + str(numSamples) + ".")
+    indices = list(range(numSamples))
+    if seed is not None:
+        Random(seed).shuffle(indices)
+    bounds = [numSamples * i // k for i in range(k + 1)]
+    return [indices[bounds[i]:bounds[i + 1]] for i in range(k)]
+
+def runFold(foldNumber):
+    """Trains and validates a fresh network on one fold of FOLD_JOB. Returns
+    the accuracy (in %) and the time taken in seconds."""
+    samples, folds, networkFactory, learningRateFunction, optimizerFactory = \
+        FOLD_JOB
+    start = time.time()
+    held = set(folds[foldNumber])
+    training = [samples[i] for i in range(len(samples)) if i not in held]
+    validation = [samples[i] for i in folds[foldNumber]]
+    network = networkFactory()
+    if isinstance(network, Perceptron):
+        trainPerceptronOnSamples(network, training, learningRateFunction,
+            summary=False)
+    else:
+        labels = network.validLabels
+        optimizer = None if optimizerFactory is None else optimizerFactory()
+        trainOnSamples(network, ((inputs, [float(l == label) for l in labels])
+            for inputs, label in training), learningRateFunction,
+            summary=False, optimizer=optimizer, progress=False)
+    correct = countCorrect(network, validation)
+    accuracy = correct*100.0/len(validation)
+    return (accuracy, time.time() - start)
+
+def crossValidate(networkFactory, learningRateFunction, sourceFile, k=5,
+        processes=None, optimizerFactory=None, seed=None, summary=True):
+    """Runs k-fold cross-validation of the networks made by networkFactory (a
+    function with no arguments) on the data in sourceFile, training each with
+    learningRateFunction (and, if optimizerFactory is given, a fresh optimizer
+    made by it). Up to processes folds run at once (by default, one per CPU).
+    If seed is given, samples are shuffled before being split into folds.
+    k must be at least 2 and at most the number of samples.
+    Returns a dictionary with the per-fold accuracies (in %) and times (in
+    seconds) under 'accuracies' and 'foldSeconds', their mean and standard
+    deviation under 'mean' and 'std', and the total wall-clock time under
+    'seconds'."""
+    global FOLD_JOB
+    start = time.time()
+    samples = readDataFile(sourceFile)
+    folds = partition(len(samples), k, seed)
+    FOLD_JOB = (samples, folds, networkFactory, learningRateFunction,
+        optimizerFactory)
+    try:
+        if processes == 1 or 'fork' not in get_all_start_methods():
+            results = [runFold(i) for i in range(k)]
+        else:
+            pool = get_context('fork').Pool(processes)
+            try:
+                results = pool.map(runFold, range(k))
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        FOLD_JOB = None
+    accuracies = [accuracy for accuracy, _ in results]
+    report = {'accuracies': accuracies,
+        'foldSeconds': [seconds for _, seconds in results],
+        'mean': mean(accuracies), 'std': pstdev(accuracies),
+        'seconds': time.time() - start}
+    if summary:
+        for i, (accuracy, seconds) in enumerate(results):
+            print("Fold " + str(i + 1) + ": " + str(accuracy) + "% accuracy, "
+                + str(round(seconds, 2)) + " seconds.")
+        print("Cross-validation complete: " + str(k) + " folds, "
+            + str(round(report['mean'], 2)) + "% mean accuracy (std "
+            + str(round(report['std'], 2)) + "), "
+            + str(round(report['seconds'], 2)) + " seconds.")
+    return report
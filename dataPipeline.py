@@ -0,0 +1,180 @@
+from threading import Thread, Event
+from multiprocessing import get_context
+from array import array
+import queue
+
+"""Background prefetching of training data. A DataPrefetcher reads and parses
+a data file in a background thread (or process) and hands batches of parsed
+samples to the trainer through a bounded queue, so that parsing overlaps with
+training instead of adding to it. The queue holds at most maxBatches batches;
+when it is full, the producer waits for the trainer to catch up. Errors in the
+producer are re-raised in the trainer, and closing the prefetcher (or leaving
+its with block) stops the producer cleanly. For example,
+    with DataPrefetcher('train.txt', net.validLabels) as samples:
+        trainOnSamples(net, samples, inverseTimeLearningRate(1))
+Note that a thread shares the interpreter lock with the trainer, so parsing
+only truly runs in parallel with useProcess=True. A producer process sends each
+batch as a few flat buffers (see encodeBatch) rather than as pickled lists.
+Even so, the trainer still has to build the lists of floats it trains on, so
+roughly a third of the parsing cost remains on the training side."""
+
+BATCH, END, ERROR = 0, 1, 2  # Kinds of messages sent by the producer
+POLL_INTERVAL = 0.1  # Seconds between checks for shutdown while blocked
+
+def parseSample(line, labels):
+    """Parses one line of a data file into (inputs, outputVector), where
+    outputVector has a 1.0 in the position of the line's label in labels and
+    0.0 elsewhere. If labels is None, returns (inputs, label) instead, as
+    readDataFile in train.py does. Returns None for blank lines."""
+    rawData = line.split()
+    if len(rawData) == 0:
+        return None
+    inputs = list(map(float, rawData[:-1]))
+    actualLabel = rawData[-1]
+    if labels is None:
+        return (inputs, actualLabel)
+    return (inputs, [float(l == actualLabel) for l in labels])
+
+def encodeBatch(rows, labels):
+    """Packs a batch of split data file lines into compact buffers that are
+    cheap to send between processes: the inputs of all rows as one array of
+    doubles, the offset at which each row's inputs end, and the labels (as
+    indices into labels, or as one space-separated string if labels is None).
+    See decodeBatch."""
+    values, ends = array('d'), array('i')
+    for rawData in rows:
+        values.extend(map(float, rawData[:-1]))
+        ends.append(len(values))
+    if labels is None:
+        return (values.tobytes(), ends.tobytes(),
+            ' '.join([rawData[-1] for rawData in rows]))
+    positions = {}
+    for i, label in enumerate(labels):
+        positions.setdefault(label, i)
+    indices = array('i', [positions.get(rawData[-1], -1) for rawData in rows])
+    return (values.tobytes(), ends.tobytes(), indices.tobytes())
+
+def decodeBatch(payload, labels):
+    """Rebuilds the samples of a batch packed by encodeBatch, as parseSample
+    would have returned them."""
+    valueData, endData, labelData = payload
+    values, ends = array('d'), array('i')
+    values.frombytes(valueData)
+    ends.frombytes(endData)
+    if labels is None:
+        outputs = labelData.split()
+    else:
+        indices = array('i')
+        indices.frombytes(labelData)
+        vectors = [[float(l == label) for l in labels] for label in labels]
+        unknown = [0.0] * len(labels)
+        outputs = [list(vectors[i]) if i >= 0 else list(unknown)
+            for i in indices]
+    samples = []
+    start = 0
+    for end, output in zip(ends, outputs):
+        samples.append((values[start:end].tolist(), output))
+        start = end
+    return samples
+
+def produceBatches(sourceFile, labels, batchSize, batches, stop,
+        compact=False):
+    """Reads sourceFile and puts batches of parsed samples in the batches
+    queue until the file ends or stop is set. If compact is True, batches are
+    sent packed by encodeBatch. Runs in the background."""
+    def send(message):
+        while not stop.is_set():
+            try:
+                batches.put(message, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+    try:
+        pack = (lambda rows: encodeBatch(rows, labels)) if compact \
+            else (lambda samples: samples)
+        batch = []
+        with open(sourceFile) as dataSource:
+            for line in dataSource:
+                if compact:
+                    sample = line.split() or None
+                else:
+                    sample = parseSample(line, labels)
+                if sample is None:
+                    continue
+                batch.append(sample)
+                if len(batch) == batchSize:
+                    if not send((BATCH, pack(batch))):
+                        return
+                    batch = []
+        if len(batch) > 0 and not send((BATCH, pack(batch))):
+            return
+        send((END, None))
+    except Exception as e:
+        send((ERROR, e))
+
+
+class DataPrefetcher(object):
+    """Iterable over the parsed samples of a data file, in file order, which
+    are read ahead in the background. Each sample is an (inputs, outputVector)
+    pair as returned by parseSample, or an (inputs, label) pair if labels is
+    None (as perceptrons are trained on)."""
+    def __init__(self, sourceFile, labels, batchSize=256, maxBatches=4,
+            useProcess=False):
+        self.sourceFile = sourceFile
+        if labels is not None:
+            labels = list(labels)
+        self.labels = labels
+        self.compact = useProcess
+        if useProcess:
+            context = get_context()
+            self.batches = context.Queue(maxBatches)
+            self.stop = context.Event()
+            self.worker = context.Process(target=produceBatches,
+                args=(sourceFile, labels, batchSize, self.batches,
+                    self.stop, True))
+        else:
+            self.batches = queue.Queue(maxBatches)
+            self.stop = Event()
+            self.worker = Thread(target=produceBatches,
+                args=(sourceFile, labels, batchSize, self.batches,
+                    self.stop))
+        self.worker.daemon = True
+        self.worker.start()
+
+    def __iter__(self):
+        try:
+            while True:
+                try:
+                    kind, payload = self.batches.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    if not self.worker.is_alive() and not self.stop.is_set():
+                        raise IOError("Prefetching of " + self.sourceFile
+                            + " stopped unexpectedly.")
+                    continue
+                if kind == END:
+                    return
+                if kind == ERROR:
+                    raise payload
+                if self.compact:
+                    payload = decodeBatch(payload, self.labels)
+                for sample in payload:
+                    yield sample
+        finally:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Stops the producer and waits for it to finish."""
+        self.stop.set()
+        while self.worker.is_alive():
+            try:  # Unblock a producer waiting on a full queue
+                self.batches.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                pass
+            self.worker.join(POLL_INTERVAL)
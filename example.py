@@ -1,5 +1,5 @@
 from network import Network, Perceptron
-from train import train, validate
+from train import train, validate, validateMany
 from train import constantLearningRate, inverseTimeLearningRate, \
     randomInverseTimeLearningRate, exponentialLearningRate
 from activationFunctions import arctanActivation
@@ -60,3 +60,15 @@ net = Network(2, [], 4, validLabels = set3Labels)
 print("\n2-4 network with inverse time learning rates, dataset 3:")
 train(net, train3, inverseTimeLearningRate(1))
 validate(net, validate3)
+
+net3 = Network(2, [], 4, validLabels = set3Labels)
+net4 = Network(2, [3], 4, bias=True, validLabels = set3Labels)
+print("\nTwo more dataset 3 networks (2-4 with a constant learning rate, 2-3-4 "
+    + "with bias):")
+train(net3, train3, constantLearningRate(0.5))
+train(net4, train3, inverseTimeLearningRate(2))
+
+print("\nThe three dataset 3 networks, validated in a single pass along with "
+    + "their majority vote and their average softmax scores:")
+validateMany([net, net3, net4], validate3, ensemble='vote')
+validateMany([net, net3, net4], validate3, ensemble='softmax')
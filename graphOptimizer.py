@@ -0,0 +1,103 @@
+from network import IdentityInputNode, BiasNode
+from activationFunctions import identityActivation
+
+"""Optimization pass over the graph of a Network. optimizeNetwork rewrites a
+network in place without changing the output of run():
+    -   Hidden nodes with no path to any output node are never evaluated, so
+        they are removed along with all of their edges.
+    -   Input nodes using the identity activation function are replaced with
+        IdentityInputNodes, which read the harness directly.
+    -   Nodes with identical parent lists share a single list object.
+Because parent lists may be shared afterwards, no new parents should be
+registered on an optimized network."""
+
+def optimizeNetwork(network, summary=True):
+    """Optimizes network in place and returns a report: the indices of the
+    removed nodes under 'removedNodes', the number of removed edges under
+    'removedEdges', the indices of the folded input nodes under 'foldedNodes'
+    and the number of parent lists that are now shared under
+    'sharedInputLists'."""
+    report = {}
+    report['removedNodes'], report['removedEdges'] = \
+        removeDeadNodes(network)
+    report['foldedNodes'] = foldIdentityInputs(network)
+    report['sharedInputLists'] = shareInputLists(network)
+    if summary:
+        print("Optimization complete: removed " + str(len(
+            report['removedNodes'])) + " nodes and " + str(
+            report['removedEdges']) + " edges, folded " + str(len(
+            report['foldedNodes'])) + " input nodes, shared "
+            + str(report['sharedInputLists']) + " parent lists.")
+    return report
+
+def removeDeadNodes(network):
+    """Removes hidden nodes that no output node depends on. Returns the sorted
+    indices of the removed nodes and the number of removed edges."""
+    live = set(network.outputLayer) | set(network.inputLayer)
+    stack = list(network.outputLayer)
+    while len(stack) > 0:
+        for parent in stack.pop().inputs:
+            if parent not in live and not isinstance(parent, BiasNode):
+                live.add(parent)
+                stack.append(parent)
+    dead = [node for layer in network.hiddenLayers for node in layer
+        if node not in live]
+    removedEdges = 0
+    for node in dead:
+        removedEdges += len(node.inputs)
+        for parent in node.inputs:
+            if not isinstance(parent, BiasNode):
+                parent.children.discard(node)
+        del network.nodes[node.index]
+    for layer in network.hiddenLayers:
+        layer[:] = [node for node in layer if node in live]
+    return (sorted(node.index for node in dead), removedEdges)
+
+def foldIdentityInputs(network):
+    """Replaces input nodes that use the identity activation function with
+    equivalent IdentityInputNodes. Returns the indices of the replaced
+    nodes."""
+    harness = network.harness
+    replacements = {}
+    for i, node in enumerate(network.inputLayer):
+        if node.activationFunc is not identityActivation or \
+                isinstance(node, IdentityInputNode):
+            continue
+        position = harness.inputNodesToIndices[node]
+        newNode = IdentityInputNode(node.index, harness, position)
+        newNode.children = node.children
+        replacements[node] = newNode
+        network.inputLayer[i] = newNode
+        network.nodes[node.index] = newNode
+    if len(replacements) == 0:
+        return []
+    # Rebuild each affected structure once, rather than editing it once per
+    # replaced parent.
+    harness.inputNodesToIndices = {replacements.get(node, node): position
+        for node, position in harness.inputNodesToIndices.items()}
+    children = set()
+    for node in replacements:
+        children |= node.children
+    for child in children:
+        child.inputs[:] = [replacements.get(parent, parent)
+            for parent in child.inputs]
+        child.weights = {replacements.get(parent, parent): weight
+            for parent, weight in child.weights.items()}
+    return [node.index for node in replacements]
+
+def shareInputLists(network):
+    """Makes nodes with identical parent lists (e.g. every node in a fully
+    connected layer) share one list. Returns the number of nodes whose list
+    was replaced by a shared one."""
+    shared = {}
+    count = 0
+    for node in network.topologicalOrder():
+        if len(node.inputs) == 0:
+            continue
+        key = tuple(id(parent) for parent in node.inputs)
+        if key not in shared:
+            shared[key] = node.inputs
+        elif shared[key] is not node.inputs:
+            node.inputs = shared[key]
+            count += 1
+    return count
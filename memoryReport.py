@@ -0,0 +1,148 @@
+from network import BiasNode
+from sys import getsizeof
+import tracemalloc
+
+"""Memory accounting for networks and loaded data sets. The reports count the
+bytes of every Python object making up a network (or data set) according to
+sys.getsizeof, counting objects shared between structures only once, and break
+the total down in several ways. Sizes are of the objects themselves; memory
+held by the allocator but not in use is not included. measurePeakMemory can be
+used around calls such as train and validate to measure the peak amount of
+memory actually allocated."""
+
+def sizeOf(obj, seen):
+    """Returns the size of obj in bytes, or 0 if it has already been seen."""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    return getsizeof(obj)
+
+def sizeOfContainer(container, seen, values=True):
+    """Returns the size of a list, tuple, set or dict along with its elements
+    (or, for dicts, its values if values is True). Elements that are nodes are
+    not counted."""
+    size = sizeOf(container, seen)
+    elements = container.values() if isinstance(container, dict) else container
+    if values or not isinstance(container, dict):
+        for element in elements:
+            if not hasattr(element, 'process'):  # Nodes are counted separately
+                size += sizeOf(element, seen)
+    return size
+
+def layerNames(network):
+    """Returns a dictionary mapping every node in the layers of network to the
+    name of its layer."""
+    names = {node: 'input' for node in network.inputLayer}
+    for i, layer in enumerate(network.hiddenLayers):
+        for node in layer:
+            names[node] = 'hidden ' + str(i + 1)
+    for node in network.outputLayer:
+        names[node] = 'output'
+    return names
+
+def networkMemoryReport(network):
+    """Returns a report of the memory used by network: the total number of
+    bytes under 'total', and the bytes by layer ('byLayer'), by node type
+    ('byNodeType') and by structure ('byStructure': node objects, weights,
+    adjacency lists, harness, run cache and the network's own containers)."""
+    seen = set()
+    byLayer, byNodeType = {}, {}
+    byStructure = {'nodes': 0, 'weights': 0, 'adjacency': 0, 'harness': 0,
+        'cache': 0, 'network': 0}
+    nodes = list(network.nodes.values())
+    biasNodes = set(parent for node in nodes for parent in node.inputs
+        if isinstance(parent, BiasNode))
+    names = layerNames(network)
+    for node in nodes + list(biasNodes):
+        objectSize = sizeOf(node, seen) + sizeOf(node.__dict__, seen) \
+            + sizeOf(node.index, seen)
+        weightSize, adjacencySize = 0, 0
+        if not isinstance(node, BiasNode):
+            weightSize = sizeOfContainer(node.weights, seen)
+            adjacencySize = sizeOfContainer(node.inputs, seen) \
+                + sizeOfContainer(node.children, seen)
+        byStructure['nodes'] += objectSize
+        byStructure['weights'] += weightSize
+        byStructure['adjacency'] += adjacencySize
+        total = objectSize + weightSize + adjacencySize
+        if isinstance(node, BiasNode):
+            layer = 'bias'
+        else:
+            layer = names.get(node, 'unattached')
+        byLayer[layer] = byLayer.get(layer, 0) + total
+        typeName = node.__class__.__name__
+        byNodeType[typeName] = byNodeType.get(typeName, 0) + total
+    harness = network.harness
+    byStructure['harness'] = sizeOf(harness, seen) \
+        + sizeOf(harness.__dict__, seen) \
+        + sizeOfContainer(harness.inputs, seen) \
+        + sizeOfContainer(harness.inputNodesToIndices, seen) \
+        + sizeOfContainer(harness.outputs, seen)
+    if network.cache is not None:
+        cache = network.cache.results
+        byStructure['cache'] = sizeOf(network.cache, seen) \
+            + sizeOfContainer(cache, seen)
+        for key in cache:
+            byStructure['cache'] += sizeOfContainer(key, seen)
+    byStructure['network'] = sizeOf(network, seen) \
+        + sizeOf(network.__dict__, seen) \
+        + sizeOfContainer(network.nodes, seen, values=False) \
+        + sizeOfContainer(network.validLabels, seen)
+    for layer in [network.inputLayer, network.outputLayer] \
+            + network.hiddenLayers + [network.hiddenLayers]:
+        byStructure['network'] += sizeOf(layer, seen)
+    return {'total': sum(byStructure.values()), 'byLayer': byLayer,
+        'byNodeType': byNodeType, 'byStructure': byStructure}
+
+def dataMemoryReport(samples):
+    """Returns a report of the memory used by a loaded data set, such as the
+    list returned by train.readDataFile: the total number of bytes under
+    'total', the number of samples under 'samples', the average bytes per
+    sample under 'bytesPerSample', and the bytes by structure under
+    'byStructure' (the sample list and tuples, the input lists, the input
+    values and the labels or output vectors)."""
+    seen = set()
+    byStructure = {'rows': sizeOf(samples, seen), 'inputs': 0, 'values': 0,
+        'labels': 0}
+    for sample in samples:
+        inputs, label = sample
+        byStructure['rows'] += sizeOf(sample, seen)
+        byStructure['inputs'] += sizeOf(inputs, seen)
+        for value in inputs:
+            byStructure['values'] += sizeOf(value, seen)
+        if isinstance(label, list):  # One-hot output vector
+            byStructure['labels'] += sizeOfContainer(label, seen)
+        else:
+            byStructure['labels'] += sizeOf(label, seen)
+    total = sum(byStructure.values())
+    return {'total': total, 'samples': len(samples),
+        'bytesPerSample': float(total)/len(samples) if samples else 0.0,
+        'byStructure': byStructure}
+
+def printMemoryReport(report):
+    """Prints a report from networkMemoryReport or dataMemoryReport."""
+    print("Total: " + str(report['total']) + " bytes")
+    for section in ['byLayer', 'byNodeType', 'byStructure']:
+        if section not in report:
+            continue
+        print(section[2:].capitalize().replace('type', ' type') + ":")
+        for name, size in sorted(report[section].items()):
+            print("\t" + name + ": " + str(size) + " bytes")
+
+def measurePeakMemory(function, *args, **kwargs):
+    """Calls function with the given arguments while tracing memory
+    allocations. Returns the result of the call and the peak number of bytes
+    allocated during it, e.g.
+        _, peak = measurePeakMemory(train, net, 'train.txt', rate)"""
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = function(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return (result, peak - baseline)
@@ -4,6 +4,7 @@ from networkExceptions import InvalidInputNodeException, BadInputException, \
     NetworkFileException
 from math import exp
 from random import random
+from collections import OrderedDict
 
 class Network(object):
     """Main class for a network. Keeps track of each layer of the network as
@@ -13,13 +14,18 @@ class Network(object):
             validLabels=None,
             inputActivationFunction=sigmoidActivation,
             hiddenActivationFunction=sigmoidActivation,
-            outputActivationFunction=sigmoidActivation):
+            outputActivationFunction=sigmoidActivation,
+            weightInitialization=None):
         """Basic initializer. Initializes a network with a given number of input
         nodes, hidden layers and hidden nodes, and output nodes. This method
         initializes a fully connected network (i.e. every node is connected to
         every node in the previous layer) by default. More complex topologies
-        can be built via .network files (see below)."""
+        can be built via .network files (see below). Weights start at 0 unless
+        a weightInitialization function is given (see
+        weightInitialization.py)."""
         self.harness = NetworkHarness()
+        self.cache = None  # Optional RunCache; see enableCache
+        self.profiler = None  # Set by an enabled NetworkProfiler
         self.nodes = {}  # Maps node indices to Node objects
         self.bias = BiasNode() if bias else False  # Initialize bias node
         self.validLabels = validLabels
@@ -60,6 +66,8 @@ class Network(object):
                 node.registerParent(parent)
             self.outputLayer.append(node)
             self.nodes[index] = node
+        if weightInitialization is not None:
+            self.initializeWeights(weightInitialization)
 
     def __str__(self):
         """Prints each layer of the network, from input to output."""
@@ -87,24 +95,78 @@ class Network(object):
     def fromFile(filename, bias=False,
         inputActivationFunction=sigmoidActivation,
         hiddenActivationFunction=sigmoidActivation,
-        outputActivationFunction=sigmoidActivation):
+        outputActivationFunction=sigmoidActivation,
+        useCache=True, weightInitialization=None):
         """Initializes a network from a .network file. See networkFileReader.py
-        for instructions on creating these files."""
+        for instructions on creating these files. If useCache is True, the
+        validated topology is cached next to the .network file, and later
+        loads of an unchanged file skip parsing and loop detection. Weights
+        are initialized as in the Network constructor."""
         from networkFileReader import NetworkFileReader
-        layers, nodes, harness, labels = NetworkFileReader.read(filename,
-            inputActivationFunction, hiddenActivationFunction,
-            outputActivationFunction, bias)
+        cached = None
+        if useCache:
+            cached = NetworkFileReader.readCached(filename,
+                inputActivationFunction, hiddenActivationFunction,
+                outputActivationFunction, bias)
+        if cached is None:
+            layers, nodes, harness, labels, digest = NetworkFileReader.read(
+                filename, inputActivationFunction, hiddenActivationFunction,
+                outputActivationFunction, bias, digest=True)
+        else:
+            layers, nodes, harness, labels = cached
         network = Network()
         network.harness, network.nodes, network.bias = harness, nodes, bias
         network.inputLayer, network.outputLayer = layers[0], layers[-1]
         network.hiddenLayers = [] if len(layers) < 3 else layers[1:-1]
         network.validLabels = labels
-        try:
-            network.run([0.0] * len(network.inputLayer))
-        except RuntimeError:
-            raise NetworkFileException("Loop detected in " + filename + ".")
+        if cached is None:
+            try:
+                network.run([0.0] * len(network.inputLayer))
+            except RuntimeError:
+                raise NetworkFileException("Loop detected in " + filename + ".")
+            if useCache:
+                NetworkFileReader.writeCache(filename, layers, labels, digest)
+        if weightInitialization is not None:
+            network.initializeWeights(weightInitialization)
         return network
 
+    def topologicalOrder(self):
+        """Returns every node in the network (excluding the bias node) ordered
+        so that each node comes after all of its parents. Input nodes come
+        first, in the order of the input layer."""
+        order = list(self.inputLayer)
+        visited = set(order)
+        for root in self.nodes.values():
+            if root in visited:
+                continue
+            stack = [(root, iter(root.inputs))]
+            visited.add(root)
+            while len(stack) > 0:  # Iterative DFS; layouts may be deep
+                node, parents = stack[-1]
+                for parent in parents:
+                    if parent not in visited and \
+                            not isinstance(parent, BiasNode):
+                        visited.add(parent)
+                        stack.append((parent, iter(parent.inputs)))
+                        break
+                else:
+                    stack.pop()
+                    order.append(node)
+        return order
+
+    def initializeWeights(self, weightInitialization):
+        """Sets the weights of every hidden and output node, from input to
+        output, using a function from weightInitialization.py."""
+        for layer in self.hiddenLayers + [self.outputLayer]:
+            for node in layer:
+                self.setWeights(node, weightInitialization(node))
+
+    def memoryReport(self):
+        """Returns a breakdown of the memory used by this network. See
+        memoryReport.py."""
+        from memoryReport import networkMemoryReport
+        return networkMemoryReport(self)
+
     def getWeights(self, node):
         """Returns the weights of a node, ordered by the order in which its
         inputs were registered."""
@@ -116,16 +178,53 @@ class Network(object):
         and the input list is [i1, i2, i3], then the newWeights vector should be
         [w1j, w2j, w3j])."""
         node.weights = {n:weight for n, weight in zip(node.inputs, newWeights)}
-
-    def run(self, data):
+        if self.cache is not None:
+            self.cache.clear()  # Cached results used the old weights
+
+    def enableCache(self, capacity=1024):
+        """Caches the results of run() for up to capacity distinct inputs,
+        evicting the least recently used input when full. The cache is cleared
+        whenever weights are changed through setWeights (which all training
+        functions use)."""
+        self.cache = RunCache(capacity)
+
+    def disableCache(self):
+        """Stops caching the results of run()."""
+        self.cache = None
+
+    def cacheStats(self):
+        """Returns the hit/miss statistics of the run() cache, or None if
+        caching is disabled."""
+        return None if self.cache is None else self.cache.stats()
+
+    def run(self, data, useCache=True):
         """Run data through the network and returns the label with the highest
-        softmax score."""
+        softmax score. If caching is enabled (see enableCache) and useCache is
+        True, repeated inputs are answered from the cache; note that node
+        values are then left over from an earlier run."""
+        if self.cache is None or not useCache:
+            return self.predict(data)
+        key = tuple(data)
+        label = self.cache.get(key)
+        if label is None:
+            label = self.predict(data)
+            self.cache.put(key, label)
+        return label
+
+    def predict(self, data):
+        """Runs data through the network, bypassing the run() cache, and
+        returns the label with the highest softmax score."""
+        softmaxScores = self.softmaxScores(data)
+        maxIndex = softmaxScores.index(max(softmaxScores))
+        return self.validLabels[maxIndex]
+
+    def softmaxScores(self, data):
+        """Runs data through the network and returns the softmax scores of the
+        output nodes, in the same order as validLabels."""
         scores = self.harness.run(data)
         exponentials = [exp(s) for s in scores]
         total = sum(exponentials)
-        softmaxScores = [x/total for x in exponentials]
-        maxIndex = softmaxScores.index(max(softmaxScores))
-        return self.validLabels[maxIndex]
+        return [x/total for x in exponentials]
 
 
 class Perceptron(Network):
@@ -139,11 +238,49 @@ class Perceptron(Network):
         inputActivationFunction=identityActivation,
         outputActivationFunction=outputActivationFunction)
 
-    def run(self, data):
-        """Overrides the general Network run() method to return 0 or 1."""
+    def predict(self, data):
+        """Overrides the general Network predict() method to return 0 or 1."""
         return str(self.harness.run(data)[0])
 
 
+class RunCache(object):
+    """Bounded cache of Network.run results keyed by input vector. When full,
+    the least recently used entry is evicted."""
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached label for key, or None if it is not cached."""
+        label = self.results.get(key)
+        if label is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.results.move_to_end(key)
+        return label
+
+    def put(self, key, label):
+        """Caches label for key, evicting the oldest entry if necessary."""
+        self.results[key] = label
+        if len(self.results) > self.capacity:
+            self.results.popitem(last=False)
+
+    def clear(self):
+        """Removes all cached results. Hit/miss statistics are kept."""
+        self.results.clear()
+
+    def stats(self):
+        """Returns a dictionary of hits, misses, hit rate, size and
+        capacity."""
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+            'hitRate': float(self.hits)/lookups if lookups else 0.0,
+            'size': len(self.results), 'capacity': self.capacity}
+
+
 BYPASS = -1  # When passed to a node's process method, uses last output.
 
 class NetworkHarness(object):
@@ -208,6 +345,14 @@ class Node(object):
         self.weights[node] = 0.0
         node.registerChild(self)
 
+    def registerParents(self, nodes):
+        """Registers several input nodes at once, in order, with the same
+        effect as calling registerParent on each of them."""
+        self.inputs.extend(nodes)
+        self.weights.update(dict.fromkeys(nodes, 0.0))
+        for node in nodes:
+            node.children.add(self)
+
     def registerChild(self, node):
         """Registers a node as a child of this node."""
         self.children.add(node)
@@ -254,6 +399,19 @@ class InputNode(Node):
             return newVal
 
 
+class IdentityInputNode(InputNode):
+    """An input node with the identity activation function folded away: it
+    reads its input straight from the harness, with no memoization or
+    activation function call. Created by graphOptimizer.optimizeNetwork."""
+    def __init__(self, index, harness, position):
+        InputNode.__init__(self, identityActivation, index, harness)
+        self.position = position  # Index of this node's input in the harness
+
+    def process(self, callingSignature=None):
+        """Returns the current input value for this node."""
+        return self.harness.inputs[self.position]
+
+
 class HiddenNode(Node):
     """A node in a hidden layer. Grabs data from either the input layer or the
     previous hidden layer to compute its value."""
@@ -32,3 +32,20 @@ class TrainingError(Exception):
 
     def __str__(self):
         return repr(self.message)
+
+class ValidationError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return repr(self.message)
+
+class UnsupportedActivationException(Exception):
+    """Signals that a node uses an activation function that cannot be exported
+    outside of the Python object graph (e.g. a user-defined function)."""
+    def __init__(self, function):
+        self.message = "Unsupported activation function: " \
+            + getattr(function, '__name__', str(function))
+
+    def __str__(self):
+        return repr(self.message)
@@ -1,6 +1,15 @@
 from network import NetworkHarness, Node, InputNode, HiddenNode, OutputNode, \
     BiasNode
 from networkExceptions import NetworkFileException
+from array import array
+from hashlib import sha1
+import io
+import os
+import random
+import struct
+import sys
+
+CACHE_MAGIC = b'NNTC\x01'  # Identifies (and versions) topology cache files
 
 class NetworkFileReader(object):
     """Utility class for reading .network layout files. A .network file
@@ -26,14 +35,23 @@ class NetworkFileReader(object):
     Lines starting with '%' are treated as comments and will be ignored. Blank
     lines will also be ignored. See examples/exampleLayout.network for an
     example of a .network file.
+
+    Once a layout has been read and validated, its topology can be saved to a
+    cache file next to the .network file (see writeCache). The cache is keyed
+    by a hash of the layout file's contents, so editing the layout invalidates
+    it automatically.
     """
     @staticmethod
     def read(filename, inputActivationFunction, hiddenActivationFunction,
-            outputActivationFunction, bias=False):
-        """Returns the layers, nodes, and harness of the new network."""
+            outputActivationFunction, bias=False, digest=False):
+        """Returns the layers, nodes, harness, and labels of the new network.
+        If digest is True, also returns the SHA-1 digest of the exact bytes
+        that were parsed (see writeCache)."""
         if not filename.endswith('.network'):
             raise NetworkFileException(filename + " is not a .network file.")
-        lines = open(filename).readlines()
+        with open(filename, 'rb') as f:
+            data = f.read()
+        lines = io.StringIO(data.decode('utf-8'), newline=None).readlines()
         lines = [line for line in lines if line[0] != '%']  # Ignore comments
         lines = [line for line in lines if line != '\n']  # Ignore blank lines
         layerSizes = None
@@ -43,28 +61,10 @@ class NetworkFileReader(object):
             raise NetworkFileException("Error reading layout file: " + str(e))
         if len(layerSizes) < 2:
             raise NetworkFileException("Not enough layers specified.")
-        harness = NetworkHarness()
-        nodes = {}
-        bias = BiasNode() if bias else False
-        # First, initialize layers with no connections
-        layers = []
+        layers, nodes, harness = NetworkFileReader.buildLayers(layerSizes,
+            inputActivationFunction, hiddenActivationFunction,
+            outputActivationFunction, bias)
         labels = list(map(str, range(layerSizes[-1])))
-        for i, size in enumerate(layerSizes):
-            layer = []
-            for j in range(size):
-                index = str(i) + '.' + str(j + 1)
-                node = None
-                if i == 0:
-                    node = InputNode(inputActivationFunction, index, harness)
-                    harness.registerInputNode(node)
-                elif i == len(layerSizes) - 1:
-                    node = OutputNode(outputActivationFunction, index, bias)
-                    harness.registerOutputNode(node)
-                else:
-                    node = HiddenNode(hiddenActivationFunction, index, bias)
-                layer.append(node)
-                nodes[index] = node
-            layers.append(layer)
         # Second, use the input file to make connections and read labels.
         try:
             for line in lines[1:]:
@@ -90,4 +90,148 @@ class NetworkFileReader(object):
                     targetNode.registerParent(parent)
         except Exception as e:
             raise NetworkFileException("Error reading layout file: " + str(e))
+        if digest:
+            return (layers, nodes, harness, labels, sha1(data).digest())
+        return (layers, nodes, harness, labels)
+
+    @staticmethod
+    def buildLayers(layerSizes, inputActivationFunction,
+            hiddenActivationFunction, outputActivationFunction, bias=False):
+        """Returns the layers, nodes, and harness of a network with the given
+        layer sizes and no connections between nodes."""
+        harness = NetworkHarness()
+        nodes = {}
+        bias = BiasNode() if bias else False
+        layers = []
+        for i, size in enumerate(layerSizes):
+            layer = []
+            for j in range(size):
+                index = str(i) + '.' + str(j + 1)
+                node = None
+                if i == 0:
+                    node = InputNode(inputActivationFunction, index, harness)
+                    harness.registerInputNode(node)
+                elif i == len(layerSizes) - 1:
+                    node = OutputNode(outputActivationFunction, index, bias)
+                    harness.registerOutputNode(node)
+                else:
+                    node = HiddenNode(hiddenActivationFunction, index, bias)
+                layer.append(node)
+                nodes[index] = node
+            layers.append(layer)
+        return (layers, nodes, harness)
+
+    @staticmethod
+    def cacheFilename(filename):
+        """Returns the path of the topology cache for a .network file."""
+        return filename + '.cache'
+
+    @staticmethod
+    def contentHash(filename):
+        """Returns the SHA-1 digest of the contents of a file."""
+        with open(filename, 'rb') as f:
+            return sha1(f.read()).digest()
+
+    @staticmethod
+    def readCached(filename, inputActivationFunction, hiddenActivationFunction,
+            outputActivationFunction, bias=False):
+        """Returns the layers, nodes, harness, and labels of the network
+        described by the topology cache for filename, or None if there is no
+        cache or the cache does not match the current contents of the file.
+        Connections are registered in bulk and no validation is done, since
+        only validated topologies are ever written to the cache."""
+        try:
+            with open(NetworkFileReader.cacheFilename(filename), 'rb') as f:
+                data = f.read()
+            digest = NetworkFileReader.contentHash(filename)
+        except (IOError, OSError):
+            return None
+        offset = len(CACHE_MAGIC)
+        if data[:offset] != CACHE_MAGIC or data[offset:offset + 20] != digest:
+            return None
+        try:
+            offset += 20
+            numLayers, = struct.unpack_from('<I', data, offset)
+            offset += 4
+            layerSizes = struct.unpack_from('<' + 'I' * numLayers, data, offset)
+            offset += 4 * numLayers
+            labelLength, = struct.unpack_from('<I', data, offset)
+            offset += 4
+            labels = data[offset:offset + labelLength].decode('utf-8').split()
+            offset += labelLength
+            numEdges, = struct.unpack_from('<I', data, offset)
+            offset += 4
+            children = array('I', data[offset:offset + 4 * numEdges])
+            offset += 4 * numEdges
+            parents = array('I', data[offset:offset + 4 * numEdges])
+        except (struct.error, ValueError):
+            return None
+        if len(parents) != numEdges or len(labels) != layerSizes[-1]:
+            return None
+        numNodes = sum(layerSizes)
+        if numEdges > 0 and max(max(children), max(parents)) >= numNodes:
+            return None
+        if sys.byteorder == 'big':
+            children.byteswap()
+            parents.byteswap()
+        layers, nodes, harness = NetworkFileReader.buildLayers(layerSizes,
+            inputActivationFunction, hiddenActivationFunction,
+            outputActivationFunction, bias)
+        ordered = [node for layer in layers for node in layer]
+        # Edges are grouped by child, so each node's parents can be registered
+        # with a single call.
+        start = 0
+        while start < numEdges:
+            end = start
+            while end < numEdges and children[end] == children[start]:
+                end += 1
+            ordered[children[start]].registerParents(
+                [ordered[p] for p in parents[start:end]])
+            start = end
         return (layers, nodes, harness, labels)
+
+    @staticmethod
+    def writeCache(filename, layers, labels, digest):
+        """Writes the topology of a validated network to the cache file for
+        filename. digest must be the digest of the file contents the topology
+        was parsed from (as returned by read), so that a file edited since
+        then never matches the cache. The topology is stored as a compact edge
+        list of node positions, grouped by child. Each writer uses its own
+        temporary file, which is then renamed over the cache file, so
+        processes that miss the cache at the same time never see each other's
+        partial writes. Failures to write are ignored, since the cache is only
+        an optimization."""
+        positions = {}
+        for layer in layers:
+            for node in layer:
+                positions[node] = len(positions)
+        children, parents = array('I'), array('I')
+        for layer in layers:
+            for node in layer:
+                for parent in node.inputs:
+                    if parent in positions:  # Skip the bias node
+                        children.append(positions[node])
+                        parents.append(positions[parent])
+        labelData = ' '.join(labels).encode('utf-8')
+        if sys.byteorder == 'big':
+            children.byteswap()
+            parents.byteswap()
+        cacheFile = NetworkFileReader.cacheFilename(filename)
+        tempFile = cacheFile + '.' + str(os.getpid()) + '.' \
+            + '%08x' % random.getrandbits(32) + '.tmp'
+        try:
+            with open(tempFile, 'xb') as f:
+                f.write(CACHE_MAGIC + digest)
+                f.write(struct.pack('<I', len(layers)))
+                f.write(struct.pack('<' + 'I' * len(layers),
+                    *[len(layer) for layer in layers]))
+                f.write(struct.pack('<I', len(labelData)) + labelData)
+                f.write(struct.pack('<I', len(children)))
+                f.write(children.tobytes())
+                f.write(parents.tobytes())
+            os.replace(tempFile, cacheFile)
+        except (IOError, OSError):
+            try:
+                os.remove(tempFile)
+            except (IOError, OSError):
+                pass
@@ -0,0 +1,86 @@
+from math import sqrt
+
+"""Optimizers for backpropagation. An optimizer turns the gradient of the
+error with respect to a weight into the change applied to that weight, and may
+keep per-weight state between training samples (keyed by the (node, parent)
+pair of the weight). The learning rate passed to an optimizer is still given
+by the learning rate function of the training session (see train.py), so
+optimizers and learning rate functions can be combined freely. Optimizers
+should not be shared between networks."""
+
+class Optimizer(object):
+    """Base class for optimizers."""
+    def update(self, key, gradient, learningRate):
+        """Returns the change for the weight identified by key, given the
+        gradient of the error with respect to that weight."""
+        raise NotImplementedError
+
+    def reset(self):
+        """Forgets all per-weight state."""
+        pass
+
+
+class SGDOptimizer(Optimizer):
+    """Plain stochastic gradient descent, the default used by training
+    functions when no optimizer is given."""
+    def update(self, key, gradient, learningRate):
+        return -1 * learningRate * gradient
+
+
+class MomentumOptimizer(Optimizer):
+    """Gradient descent with momentum: each change is the previous change
+    scaled by momentum, plus the plain gradient descent step."""
+    def __init__(self, momentum=0.9):
+        self.momentum = momentum
+        self.velocities = {}
+
+    def update(self, key, gradient, learningRate):
+        velocity = self.momentum * self.velocities.get(key, 0.0) \
+            - learningRate * gradient
+        self.velocities[key] = velocity
+        return velocity
+
+    def reset(self):
+        self.velocities = {}
+
+
+class RMSPropOptimizer(Optimizer):
+    """Scales each step by a decaying average of the weight's squared
+    gradients."""
+    def __init__(self, decay=0.9, epsilon=1e-8):
+        self.decay = decay
+        self.epsilon = epsilon
+        self.meanSquares = {}
+
+    def update(self, key, gradient, learningRate):
+        meanSquare = self.decay * self.meanSquares.get(key, 0.0) \
+            + (1 - self.decay) * gradient ** 2
+        self.meanSquares[key] = meanSquare
+        return -1 * learningRate * gradient / (sqrt(meanSquare) + self.epsilon)
+
+    def reset(self):
+        self.meanSquares = {}
+
+
+class AdamOptimizer(Optimizer):
+    """Adam: uses bias-corrected decaying averages of each weight's gradients
+    and squared gradients."""
+    def __init__(self, beta1=0.9, beta2=0.999, epsilon=1e-8):
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.epsilon = epsilon
+        self.moments = {}  # Maps keys to (mean, mean square, step count)
+
+    def update(self, key, gradient, learningRate):
+        mean, meanSquare, t = self.moments.get(key, (0.0, 0.0, 0))
+        mean = self.beta1 * mean + (1 - self.beta1) * gradient
+        meanSquare = self.beta2 * meanSquare + (1 - self.beta2) * gradient ** 2
+        t += 1
+        self.moments[key] = (mean, meanSquare, t)
+        correctedMean = mean / (1 - self.beta1 ** t)
+        correctedMeanSquare = meanSquare / (1 - self.beta2 ** t)
+        return -1 * learningRate * correctedMean \
+            / (sqrt(correctedMeanSquare) + self.epsilon)
+
+    def reset(self):
+        self.moments = {}
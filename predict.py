@@ -0,0 +1,196 @@
+from network import Network, Perceptron, InputNode, HiddenNode, OutputNode, \
+    BiasNode
+from networkExceptions import ValidationError, NetworkFileException
+import activationFunctions
+from multiprocessing import get_context, get_all_start_methods
+from collections import deque
+import argparse
+import json
+import sys
+import time
+
+"""Bulk prediction. predictFile streams a data file through a trained network
+and writes one line per row with the predicted label (and, optionally, the
+softmax score of every label), in input order. Rows are read and scored in
+batches, optionally across several worker processes, so memory use stays
+constant however large the file is. Rows may be unlabeled (just the inputs) or
+labeled like training data, in which case the label is ignored.
+
+Trained networks can be saved with saveModel and loaded with loadModel, which
+makes bulk prediction available from the command line:
+    python predict.py model.json input.txt [output.txt] [--scores]
+        [--batch-size N] [--processes N]
+Predictions are written to standard output if no output file is given."""
+
+PREDICT_JOB = None  # (network, scores) for forked workers
+
+def predictLine(network, line, scores=False):
+    """Returns the output line for one row of a data file."""
+    fields = line.split()
+    if len(fields) == len(network.inputLayer) + 1:
+        fields = fields[:-1]  # Ignore labels
+    inputs = list(map(float, fields))
+    if not scores:
+        return str(network.run(inputs))
+    softmaxScores = network.softmaxScores(inputs)
+    label = network.validLabels[softmaxScores.index(max(softmaxScores))]
+    return ' '.join([label] + [repr(s) for s in softmaxScores])
+
+def predictBatch(lines):
+    """Returns the output lines for a batch of rows, using PREDICT_JOB."""
+    network, scores = PREDICT_JOB
+    return [predictLine(network, line, scores) for line in lines]
+
+def readBatches(dataSource, batchSize):
+    """Yields lists of up to batchSize non-blank lines from dataSource."""
+    batch = []
+    for line in dataSource:
+        if line.strip() == '':
+            continue
+        batch.append(line)
+        if len(batch) == batchSize:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+def predictFile(network, inputFile, outputFile=None, batchSize=1000,
+        processes=1, scores=False, summary=True):
+    """Writes a prediction for every row of inputFile to outputFile (or to
+    standard output if outputFile is None), in input order. Each output line
+    holds the predicted label, followed by the softmax score of every label
+    (in the order of validLabels) if scores is True. With processes > 1,
+    batches are scored by that many forked workers, with at most two batches
+    per worker in flight at any time. Returns a dictionary with the number of
+    rows, the time taken in seconds and the rows per second; if summary is
+    True, these are also printed to standard error."""
+    global PREDICT_JOB
+    if scores and isinstance(network, Perceptron):
+        raise ValidationError("Perceptrons have no softmax scores.")
+    start = time.time()
+    rows = 0
+    PREDICT_JOB = (network, scores)
+    dataSource = open(inputFile)
+    target = sys.stdout if outputFile is None else open(outputFile, 'w')
+    pool = None
+    try:
+        batches = readBatches(dataSource, batchSize)
+        if processes > 1 and 'fork' in get_all_start_methods():
+            pool = get_context('fork').Pool(processes)
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.apply_async(predictBatch, (batch,)))
+                if len(pending) >= 2 * processes:  # Bound work in flight
+                    results = pending.popleft().get()
+                    target.write('\n'.join(results) + '\n')
+                    rows += len(results)
+            while len(pending) > 0:
+                results = pending.popleft().get()
+                target.write('\n'.join(results) + '\n')
+                rows += len(results)
+        else:
+            for batch in batches:
+                results = predictBatch(batch)
+                target.write('\n'.join(results) + '\n')
+                rows += len(results)
+    finally:
+        PREDICT_JOB = None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        dataSource.close()
+        if outputFile is None:
+            target.flush()
+        else:
+            target.close()
+    seconds = time.time() - start
+    rowsPerSecond = rows/seconds if seconds > 0 else float('inf')
+    if summary:
+        sys.stderr.write("Prediction complete: " + str(rows) + " rows, "
+            + str(round(seconds, 2)) + " seconds, "
+            + str(round(rowsPerSecond, 1)) + " rows/sec.\n")
+    return {'rows': rows, 'seconds': seconds, 'rowsPerSecond': rowsPerSecond}
+
+def saveModel(network, filename):
+    """Saves the topology, activation functions, weights and labels of a
+    network to a JSON file. Only activation functions from
+    activationFunctions.py can be saved."""
+    layers = [network.inputLayer] + network.hiddenLayers \
+        + [network.outputLayer]
+    biasValue = None
+    savedLayers = []
+    for layer in layers:
+        savedLayer = []
+        for node in layer:
+            name = node.activationFunc.__name__
+            if getattr(activationFunctions, name, None) is not \
+                    node.activationFunc:
+                raise ValidationError("Cannot save activation function "
+                    + name + ".")
+            inputs = []
+            for parent in node.inputs:
+                if isinstance(parent, BiasNode):
+                    biasValue = parent.value
+                inputs.append(parent.index)
+            savedLayer.append({'index': node.index, 'activation': name,
+                'inputs': inputs, 'weights': network.getWeights(node)})
+        savedLayers.append(savedLayer)
+    model = {'type': network.__class__.__name__, 'bias': biasValue,
+        'labels': list(network.validLabels), 'layers': savedLayers}
+    with open(filename, 'w') as f:
+        json.dump(model, f)
+
+def loadModel(filename):
+    """Loads a network saved with saveModel."""
+    try:
+        with open(filename) as f:
+            model = json.load(f)
+        networkClass = Perceptron if model['type'] == 'Perceptron' else Network
+        network = networkClass.__new__(networkClass)
+        Network.__init__(network)
+        bias = BiasNode(model['bias']) if model['bias'] is not None else False
+        layers = []
+        for i, savedLayer in enumerate(model['layers']):
+            layer = []
+            for saved in savedLayer:
+                function = getattr(activationFunctions, saved['activation'])
+                nodeBias = bias if 'bias' in saved['inputs'] else False
+                if i == 0:
+                    node = InputNode(function, saved['index'], network.harness)
+                    network.harness.registerInputNode(node)
+                elif i == len(model['layers']) - 1:
+                    node = OutputNode(function, saved['index'], nodeBias)
+                    network.harness.registerOutputNode(node)
+                else:
+                    node = HiddenNode(function, saved['index'], nodeBias)
+                layer.append(node)
+                network.nodes[node.index] = node
+            layers.append(layer)
+        for savedLayer in model['layers']:
+            for saved in savedLayer:
+                node = network.nodes[saved['index']]
+                node.registerParents([network.nodes[index]
+                    for index in saved['inputs'] if index != 'bias'])
+                network.setWeights(node, saved['weights'])
+    except (KeyError, TypeError, AttributeError, ValueError) as e:
+        raise NetworkFileException("Error reading model file: " + str(e))
+    network.bias = bias
+    network.inputLayer, network.outputLayer = layers[0], layers[-1]
+    network.hiddenLayers = layers[1:-1]
+    network.validLabels = model['labels']
+    return network
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Writes predictions of a "
+        + "saved network for every row of a data file.")
+    parser.add_argument('model', help="model file written by saveModel")
+    parser.add_argument('input', help="data file to predict")
+    parser.add_argument('output', nargs='?', default=None,
+        help="output file (standard output by default)")
+    parser.add_argument('--scores', action='store_true',
+        help="also write the softmax score of every label")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--processes', type=int, default=1)
+    args = parser.parse_args()
+    predictFile(loadModel(args.model), args.input, args.output,
+        args.batch_size, args.processes, args.scores)
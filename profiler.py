@@ -0,0 +1,167 @@
+from network import BYPASS, BiasNode
+from time import perf_counter
+import json
+
+"""Per-node profiling of forward and backward passes. While enabled, a
+NetworkProfiler wraps the process() and getWeightedInputSum() methods of every
+node in a network and counts, for each node index:
+    -   process() calls, and how many were memoization hits (repeat calls in
+        the same run, or BYPASS calls during backpropagation),
+    -   weighted sums computed,
+    -   retries in the backward sweep of backpropagation (a node is retried
+        when some of its children's errors are not yet known),
+along with the time spent in each node, both including its parents ('total')
+and excluding them ('self'). It also counts how often each edge is evaluated.
+Disabling the profiler removes the wrappers, so profiling costs nothing when
+it is not in use. For example,
+    with NetworkProfiler(net) as profiler:
+        train(net, 'train.txt', inverseTimeLearningRate(1))
+    print(profiler.table())
+"""
+
+class NodeStats(object):
+    """Counters and timings for a single node."""
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.sums = 0
+        self.retries = 0
+        self.selfTime = 0.0
+        self.totalTime = 0.0
+        self.sumTime = 0.0
+
+    def toDict(self):
+        return {'calls': self.calls, 'hits': self.hits, 'sums': self.sums,
+            'retries': self.retries, 'selfTime': self.selfTime,
+            'totalTime': self.totalTime, 'sumTime': self.sumTime}
+
+
+class NetworkProfiler(object):
+    """Opt-in profiler for a single network. See above."""
+    def __init__(self, network):
+        self.network = network
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        """Clears all counters and timings."""
+        self.stats = {}  # Maps node indices to NodeStats
+        self.edges = {}  # Maps (parent index, child index) to evaluations
+        self.stack = []  # Time spent in parents, for each active process()
+
+    def enable(self):
+        """Starts profiling by wrapping the methods of every node."""
+        if self.enabled:
+            return
+        for node in self.network.nodes.values():
+            if not isinstance(node, BiasNode):
+                self.wrap(node)
+        self.network.profiler = self
+        self.enabled = True
+
+    def disable(self):
+        """Stops profiling and restores the original methods of every node.
+        Collected statistics are kept."""
+        if not self.enabled:
+            return
+        for node in self.network.nodes.values():
+            for name in ['process', 'getWeightedInputSum']:
+                if name in node.__dict__:
+                    delattr(node, name)
+        self.network.profiler = None
+        self.enabled = False
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *args):
+        self.disable()
+
+    def nodeStats(self, node):
+        if node.index not in self.stats:
+            self.stats[node.index] = NodeStats()
+        return self.stats[node.index]
+
+    def wrap(self, node):
+        """Replaces node's process() and getWeightedInputSum() methods, on
+        this instance only, with profiled versions."""
+        stats = self.nodeStats(node)
+        stack = self.stack
+        edges = self.edges
+        process = node.process
+        weightedInputSum = node.getWeightedInputSum
+        def profiledProcess(callingSignature=None):
+            stats.calls += 1
+            if callingSignature == BYPASS or \
+                    callingSignature == node.lastSignature:
+                stats.hits += 1
+            stack.append(0.0)
+            start = perf_counter()
+            try:
+                return process(callingSignature)
+            finally:
+                elapsed = perf_counter() - start
+                parentTime = stack.pop()
+                stats.totalTime += elapsed
+                stats.selfTime += elapsed - parentTime
+                if len(stack) > 0:
+                    stack[-1] += elapsed
+        def profiledWeightedInputSum(callingSignature):
+            stats.sums += 1
+            for parent in node.inputs:
+                edge = (parent.index, node.index)
+                edges[edge] = edges.get(edge, 0) + 1
+            start = perf_counter()
+            try:
+                return weightedInputSum(callingSignature)
+            finally:
+                stats.sumTime += perf_counter() - start
+        node.process = profiledProcess
+        node.getWeightedInputSum = profiledWeightedInputSum
+
+    def recordRetry(self, node):
+        """Called by backpropagation when a node has to be retried in a later
+        sweep of the backward pass."""
+        self.nodeStats(node).retries += 1
+
+    def heaviestNodes(self, top=10):
+        """Returns up to top (index, NodeStats) pairs, by self time."""
+        ranked = sorted(self.stats.items(),
+            key=lambda item: item[1].selfTime, reverse=True)
+        return ranked[:top]
+
+    def heaviestEdges(self, top=10):
+        """Returns up to top ((parent index, child index), evaluations) pairs,
+        by number of evaluations."""
+        ranked = sorted(self.edges.items(), key=lambda item: item[1],
+            reverse=True)
+        return ranked[:top]
+
+    def table(self, top=10):
+        """Returns a printable table of the heaviest nodes and edges."""
+        lines = ["%-10s %10s %10s %10s %10s %12s %12s" % ('node', 'calls',
+            'hits', 'sums', 'retries', 'self ms', 'total ms')]
+        for index, stats in self.heaviestNodes(top):
+            lines.append("%-10s %10d %10d %10d %10d %12.3f %12.3f" % (index,
+                stats.calls, stats.hits, stats.sums, stats.retries,
+                stats.selfTime * 1000, stats.totalTime * 1000))
+        lines.append('')
+        lines.append("%-22s %10s" % ('edge', 'evaluations'))
+        for (parent, child), count in self.heaviestEdges(top):
+            lines.append("%-22s %10d" % (parent + ' -> ' + child, count))
+        return '\n'.join(lines)
+
+    def toJSON(self):
+        """Returns all collected statistics as a JSON string."""
+        return json.dumps({
+            'nodes': {index: stats.toDict()
+                for index, stats in self.stats.items()},
+            'edges': [{'parent': parent, 'child': child, 'evaluations': count}
+                for (parent, child), count in self.edges.items()]
+        }, indent=2, sort_keys=True)
+
+    def exportJSON(self, filename):
+        """Writes all collected statistics to filename as JSON."""
+        with open(filename, 'w') as f:
+            f.write(self.toJSON())
@@ -0,0 +1,261 @@
+from activationFunctions import identityActivation, zeroOneActivation, \
+    sigmoidActivation, arctanActivation
+from networkExceptions import UnsupportedActivationException, \
+    BadInputException
+from network import Perceptron
+from multiprocessing import shared_memory, resource_tracker
+from math import exp
+import struct
+
+"""Hosts trained networks in shared memory so that many worker processes can
+score with one copy of the weights. A publisher writes each version of a model
+into its own segment and then flips a small control segment to point at it;
+readers attach a SharedNetworkView, which runs the forward pass directly out
+of the shared buffers and picks up newly published versions on its next run.
+For example, in the serving process:
+    publisher = SharedNetworkPublisher('scorer')
+    publisher.publish(net)
+and in each worker:
+    view = SharedNetworkView('scorer')
+    view.run([0.4, -1.2, 5.2])
+"""
+
+# Activation functions that can be stored in shared memory, by code
+ACTIVATIONS = [identityActivation, zeroOneActivation, sigmoidActivation,
+    arctanActivation]
+ACTIVATION_CODES = {f: code for code, f in enumerate(ACTIVATIONS)}
+
+# version, perceptron flag, numNodes, numInputs, numOutputs, numEdges,
+# bias value, length of the encoded labels
+HEADER = struct.Struct('<QIIIIIdI')
+CONTROL = struct.Struct('<Q')  # Currently published version
+
+def segmentName(name, version):
+    """Returns the name of the segment holding a given version of a model."""
+    return name + '_' + str(version)
+
+def createSegment(name, size):
+    """Creates a shared memory segment that is not tracked by this process'
+    resource tracker. Segments are shared between unrelated processes, so
+    their lifetime is managed explicitly with unlinkSegment."""
+    try:
+        return shared_memory.SharedMemory(name=name, create=True, size=size,
+            track=False)
+    except TypeError:  # Python < 3.13 has no track argument
+        segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+def attachSegment(name):
+    """Attaches to an existing shared memory segment without handing it to
+    this process' resource tracker, which would otherwise unlink it when the
+    process exits."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+def unlinkSegment(segment):
+    """Closes and unlinks a segment made by createSegment. Processes that are
+    still attached keep their mapping until they close it."""
+    segment.close()
+    if not hasattr(segment, '_track'):
+        # Older versions always unregister on unlink, so re-register first
+        resource_tracker.register(segment._name, 'shared_memory')
+    segment.unlink()
+
+
+def unlinkIfPresent(name):
+    """Unlinks the segment with the given name, if there is one."""
+    try:
+        unlinkSegment(attachSegment(name))
+    except FileNotFoundError:
+        pass
+
+
+class SharedNetworkPublisher(object):
+    """Publishes versions of a trained network under a fixed name. Only the
+    publisher creates and unlinks segments; call close() when done serving.
+    There should be at most one publisher per name at a time.
+
+    Segments are not removed automatically when the publisher's process
+    exits, so if a publisher crashes (or exits without calling close()), its
+    segments stay in shared memory and readers keep serving the last
+    published version. A new publisher under the same name takes over: it
+    reuses the control segment, continues numbering versions from the last
+    published one, and removes any segments left behind by an interrupted
+    publish. The last published version is removed by the next publish (or
+    close)."""
+    def __init__(self, name):
+        self.name = name
+        self.segment = None
+        try:
+            self.control = createSegment(name, CONTROL.size)
+            CONTROL.pack_into(self.control.buf, 0, 0)
+            self.version = 0
+            return
+        except FileExistsError:
+            self.control = attachSegment(name)
+        self.version = CONTROL.unpack_from(self.control.buf, 0)[0]
+        # A crash mid-publish can leave the next version half written, or the
+        # previous version not yet unlinked.
+        unlinkIfPresent(segmentName(name, self.version + 1))
+        if self.version > 0:
+            unlinkIfPresent(segmentName(name, self.version - 1))
+            try:
+                self.segment = attachSegment(segmentName(name, self.version))
+            except FileNotFoundError:
+                pass
+
+    def publish(self, network):
+        """Writes the topology and weights of network to a new segment and
+        atomically makes it the current version. Returns the new version."""
+        order = network.topologicalOrder()
+        positions = {node: i for i, node in enumerate(order)}
+        numInputs = len(network.inputLayer)
+        biasValue = 0.0
+        biasWeights, activations, starts, parents, weights = [], [], [0], [], []
+        for node in order:
+            if node.activationFunc not in ACTIVATION_CODES:
+                raise UnsupportedActivationException(node.activationFunc)
+            activations.append(ACTIVATION_CODES[node.activationFunc])
+            biasWeight = 0.0
+            for parent in node.inputs if positions[node] >= numInputs else []:
+                if parent in positions:
+                    parents.append(positions[parent])
+                    weights.append(node.weights[parent])
+                else:  # Bias node
+                    biasValue = parent.value
+                    biasWeight = node.weights[parent]
+            biasWeights.append(biasWeight)
+            starts.append(len(parents))
+        outputs = [positions[node] for node in network.outputLayer]
+        labels = ' '.join(network.validLabels).encode('utf-8')
+        numNodes, numEdges = len(order), len(parents)
+        header = (self.version + 1, int(isinstance(network, Perceptron)),
+            numNodes, numInputs, len(outputs), numEdges, biasValue, len(labels))
+        # Doubles first, then 32-bit integers, then bytes, so that every
+        # array stays aligned for memoryview casts.
+        layout = ['d' * numEdges, 'd' * numNodes, 'I' * numEdges,
+            'I' * (numNodes + 1), 'I' * numNodes, 'I' * len(outputs)]
+        body = struct.Struct('<' + ''.join(layout))
+        size = HEADER.size + body.size + len(labels)
+        self.version += 1
+        segment = createSegment(segmentName(self.name, self.version), size)
+        HEADER.pack_into(segment.buf, 0, *header)
+        body.pack_into(segment.buf, HEADER.size, *(weights + biasWeights
+            + parents + starts + activations + outputs))
+        segment.buf[HEADER.size + body.size:size] = labels
+        # Readers only ever follow the control segment, so the new version
+        # becomes visible in one 8-byte store once it is fully written.
+        CONTROL.pack_into(self.control.buf, 0, self.version)
+        if self.segment is not None:
+            unlinkSegment(self.segment)  # Attached readers keep their mapping
+        self.segment = segment
+        return self.version
+
+    def close(self):
+        """Unlinks the control segment and the current model segment."""
+        if self.segment is not None:
+            unlinkSegment(self.segment)
+            self.segment = None
+        unlinkSegment(self.control)
+
+
+class SharedNetworkView(object):
+    """Read-only view of a network published by a SharedNetworkPublisher. The
+    weights and topology are never copied into this process; run() reads them
+    from shared memory and returns the same label as Network.run. Each run
+    checks for (and switches to) newly published versions."""
+    def __init__(self, name):
+        self.name = name
+        self.control = attachSegment(name)
+        self.segment = None
+        self.version = None
+        self.refresh()
+
+    def refresh(self):
+        """Switches to the currently published version, if it has changed."""
+        while True:
+            version = CONTROL.unpack_from(self.control.buf, 0)[0]
+            if version == self.version:
+                return
+            try:
+                segment = attachSegment(segmentName(self.name, version))
+            except FileNotFoundError:
+                if CONTROL.unpack_from(self.control.buf, 0)[0] == version:
+                    raise  # Nothing published (or publisher closed)
+                continue  # Replaced before we could attach; reread control
+            break
+        self.release()
+        self.segment = segment
+        self.version = version
+        buf = segment.buf.toreadonly()
+        _, perceptron, numNodes, numInputs, numOutputs, numEdges, \
+            self.biasValue, labelLength = HEADER.unpack_from(buf, 0)
+        self.perceptron = bool(perceptron)
+        self.numInputs = numInputs
+        offset = HEADER.size
+        self.weights = buf[offset:offset + 8 * numEdges].cast('d')
+        offset += 8 * numEdges
+        self.biasWeights = buf[offset:offset + 8 * numNodes].cast('d')
+        offset += 8 * numNodes
+        self.parents = buf[offset:offset + 4 * numEdges].cast('I')
+        offset += 4 * numEdges
+        self.starts = buf[offset:offset + 4 * (numNodes + 1)].cast('I')
+        offset += 4 * (numNodes + 1)
+        codes = buf[offset:offset + 4 * numNodes].cast('I')
+        self.activations = [ACTIVATIONS[code] for code in codes]
+        codes.release()
+        offset += 4 * numNodes
+        self.outputs = buf[offset:offset + 4 * numOutputs].cast('I')
+        offset += 4 * numOutputs
+        self.validLabels = bytes(buf[offset:offset + labelLength]).decode(
+            'utf-8').split()
+        self.buffer = buf
+
+    def release(self):
+        """Releases the buffers of the currently attached version."""
+        if self.segment is None:
+            return
+        for view in [self.weights, self.biasWeights, self.parents,
+                self.starts, self.outputs, self.buffer]:
+            view.release()
+        self.segment.close()
+        self.segment = None
+
+    def close(self):
+        """Detaches from shared memory. The view cannot be used afterwards."""
+        self.release()
+        self.control.close()
+
+    def scores(self, data):
+        """Returns the output values of the network for data, in the order of
+        the output layer."""
+        self.refresh()
+        if len(data) != self.numInputs:
+            raise BadInputException(self.numInputs, len(data))
+        activations, weights, parents = self.activations, self.weights, \
+            self.parents
+        starts, biasWeights = self.starts, self.biasWeights
+        values = [activations[i](data[i]) for i in range(self.numInputs)]
+        for position in range(self.numInputs, len(activations)):
+            weightedInput = self.biasValue * biasWeights[position]
+            for edge in range(starts[position], starts[position + 1]):
+                weightedInput += values[parents[edge]] * weights[edge]
+            values.append(activations[position](weightedInput))
+        return [values[position] for position in self.outputs]
+
+    def run(self, data):
+        """Runs data through the published network and returns the label with
+        the highest softmax score (or 0/1 for a perceptron)."""
+        scores = self.scores(data)
+        if self.perceptron:
+            return str(scores[0])
+        exponentials = [exp(s) for s in scores]
+        total = sum(exponentials)
+        softmaxScores = [x/total for x in exponentials]
+        maxIndex = softmaxScores.index(max(softmaxScores))
+        return self.validLabels[maxIndex]
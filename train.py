@@ -1,7 +1,9 @@
-from random import random
+from random import random, Random
 from network import Perceptron, BYPASS
 from activationFunctions import DERIVATIVES
-from networkExceptions import TrainingError
+from networkExceptions import TrainingError, ValidationError
+from dataPipeline import DataPrefetcher, parseSample
+from optimizers import SGDOptimizer
 
 """ -- Learning rate functions -- """
 """These functions return functions which take a time argument as a parameter
@@ -34,19 +36,187 @@ def exponentialLearningRate(base):
 
 """ -- Training functions -- """
 
-def train(network, sourceFile, learningRateFunction, summary=True):
-    """Main function for training networks."""
+def train(network, sourceFile, learningRateFunction, summary=True,
+        optimizer=None, prefetch=False):
+    """Main function for training networks. optimizer may be any optimizer
+    from optimizers.py; it is ignored for perceptrons, which always use the
+    perceptron learning rule. If prefetch is True, the data file is parsed in
+    a background process while the network trains (see dataPipeline.py)."""
+    if prefetch and isinstance(network, Perceptron):
+        with DataPrefetcher(sourceFile, None, useProcess=True) as samples:
+            trainPerceptronOnSamples(network, samples, learningRateFunction,
+                summary)
+        return
+    if prefetch:
+        with DataPrefetcher(sourceFile, network.validLabels,
+                useProcess=True) as samples:
+            trainOnSamples(network, samples, learningRateFunction, summary,
+                optimizer)
+        return
     dataSource = open(sourceFile)
     if isinstance(network, Perceptron):
         trainPerceptron(network, dataSource, learningRateFunction, summary)
     else:
-        trainNetwork(network, dataSource, learningRateFunction, summary)
+        trainNetwork(network, dataSource, learningRateFunction, summary,
+            optimizer)
+
+def trainEpochs(network, sourceFile, learningRateFunction, epochs,
+        validationFile=None, evaluateEvery=None, evaluateEveryEpochs=1,
+        patience=3, minImprovement=0.0, seed=None, optimizer=None,
+        summary=True):
+    """Trains a network for up to the given number of epochs (passes over the
+    data in sourceFile), reading the file only once. Each epoch visits the
+    samples in a new random order (reproducible if seed is given), and the
+    learning rate clock keeps counting across epochs. If validationFile is
+    given, the network is validated on it every evaluateEvery samples or, if
+    evaluateEvery is None, at the end of every evaluateEveryEpochs epochs
+    (both must be at least 1). Training stops early once accuracy has failed
+    to improve by more than minImprovement percentage points for patience
+    evaluations in a row. optimizer is as in train. Returns a dictionary with
+    the number of samples trained on ('samples'), updates made ('updates'),
+    epochs started ('epochs'), the (samples, accuracy) pair of every
+    validation ('history'), the best validation accuracy ('bestAccuracy') and
+    whether training stopped early ('stoppedEarly')."""
+    if evaluateEvery is not None and evaluateEvery < 1:
+        raise TrainingError("evaluateEvery must be None or at least 1.")
+    if evaluateEveryEpochs < 1:
+        raise TrainingError("evaluateEveryEpochs must be at least 1.")
+    rows = readDataFile(sourceFile)
+    if isinstance(network, Perceptron):
+        trainer, options = trainPerceptronOnSamples, {}
+    else:
+        labels = network.validLabels
+        rows = [(inputs, [float(l == label) for l in labels])
+            for inputs, label in rows]
+        trainer = trainOnSamples
+        options = {'optimizer': optimizer, 'progress': False}
+    validation = readDataFile(validationFile) if validationFile else None
+    generator = Random(seed)
+    order = list(range(len(rows)))
+    t, numUpdates, sinceEvaluation, staleEvaluations = 0, 0, 0, 0
+    history, bestAccuracy, stoppedEarly = [], None, False
+    epoch = 0
+    while epoch < epochs and not stoppedEarly:
+        epoch += 1
+        generator.shuffle(order)  # Only the indices move, never the rows
+        position = 0
+        while position < len(rows) and not stoppedEarly:
+            end = len(rows)
+            if evaluateEvery is not None:
+                end = min(end, position + evaluateEvery - sinceEvaluation)
+            batch = (rows[i] for i in order[position:end])
+            t, updates = trainer(network, batch, learningRateFunction,
+                summary=False, startTime=t, **options)
+            numUpdates += updates
+            sinceEvaluation += end - position
+            position = end
+            if evaluateEvery is None:
+                due = position == len(rows) and \
+                    epoch % evaluateEveryEpochs == 0
+            else:
+                due = sinceEvaluation >= evaluateEvery
+            if validation is None or not due:
+                continue
+            sinceEvaluation = 0
+            correct = countCorrect(network, validation)
+            accuracy = correct*100.0/len(validation) if validation else 0.0
+            history.append((t, accuracy))
+            if summary:
+                print("Epoch " + str(epoch) + ", " + str(t) + " samples: "
+                    + str(accuracy) + "% validation accuracy.")
+            if bestAccuracy is None or accuracy > bestAccuracy + minImprovement:
+                bestAccuracy, staleEvaluations = accuracy, 0
+            else:
+                staleEvaluations += 1
+                stoppedEarly = staleEvaluations >= patience
+    if summary:
+        print("Training complete: " + str(t) + " samples, " + str(numUpdates)
+            + " updates, " + str(epoch) + " epochs"
+            + (" (stopped early)." if stoppedEarly else "."))
+    return {'samples': t, 'updates': numUpdates, 'epochs': epoch,
+        'history': history, 'bestAccuracy': bestAccuracy,
+        'stoppedEarly': stoppedEarly}
 
 def validate(network, sourceFile, summary=True):
     """Main function for validating networks."""
     dataSource = open(sourceFile)
     validateNetwork(network, dataSource, summary)
 
+def validateMany(networks, sourceFile, ensemble=None, summary=True):
+    """Validates several networks against one data file, which is read and
+    parsed only once. ensemble may be 'vote', to also score the majority vote
+    of the networks (ties go to the label of the earliest network), or
+    'softmax', to score the label with the highest average softmax score (all
+    networks must then be non-perceptron Networks with the same labels).
+    Returns a dictionary with the list of per-network accuracies (in %) under
+    'accuracies' and, if requested, the ensemble accuracy under 'ensemble'."""
+    if ensemble not in [None, 'vote', 'softmax']:
+        raise ValidationError("Unknown ensemble method: " + str(ensemble))
+    if ensemble == 'softmax':
+        for net in networks:
+            if isinstance(net, Perceptron) or \
+                    list(net.validLabels) != list(networks[0].validLabels):
+                raise ValidationError("Softmax ensembles need networks with "
+                    + "identical labels.")
+    samples = readDataFile(sourceFile)
+    correct = [0] * len(networks)
+    ensembleCorrect = 0
+    for inputs, label in samples:
+        if ensemble == 'softmax':
+            # Predictions are derived from the scores, so each network only
+            # runs once per sample.
+            labels = networks[0].validLabels
+            allScores = [net.softmaxScores(inputs) for net in networks]
+            predictions = [labels[s.index(max(s))] for s in allScores]
+            totals = [sum(scores) for scores in zip(*allScores)]
+            ensemblePrediction = labels[totals.index(max(totals))]
+        else:
+            predictions = [str(net.run(inputs)) for net in networks]
+        for i, prediction in enumerate(predictions):
+            if prediction == label:
+                correct[i] += 1
+        if ensemble == 'vote':
+            votes = {}
+            for prediction in predictions:
+                votes[prediction] = votes.get(prediction, 0) + 1
+            # max returns the first maximal prediction, i.e. the earliest
+            ensemblePrediction = max(predictions, key=lambda p: votes[p])
+        if ensemble is not None and ensemblePrediction == label:
+            ensembleCorrect += 1
+    total = len(samples)
+    accuracies = [c*100.0/total if total else 0.0 for c in correct]
+    results = {'accuracies': accuracies}
+    if ensemble is not None:
+        results['ensemble'] = ensembleCorrect*100.0/total if total else 0.0
+    if summary:
+        for i, accuracy in enumerate(accuracies):
+            print("Network " + str(i + 1) + ": " + str(correct[i])
+                + " correct, " + str(accuracy) + "% accuracy.")
+        if ensemble is not None:
+            print("Ensemble (" + ensemble + "): " + str(ensembleCorrect)
+                + " correct, " + str(results['ensemble']) + "% accuracy.")
+        print("Validation complete: " + str(total) + " samples, "
+            + str(len(networks)) + " networks.")
+    return results
+
+def countCorrect(network, samples):
+    """Returns the number of parsed (inputs, label) samples (see readDataFile)
+    that network labels correctly."""
+    return len([1 for inputs, label in samples
+        if str(network.run(inputs)) == label])
+
+def readDataFile(sourceFile):
+    """Reads and parses a data file (see validateNetwork for the format) into
+    a list of (inputs, label) pairs, where inputs is a list of floats."""
+    samples = []
+    with open(sourceFile) as dataSource:
+        for line in dataSource:
+            data = line.split()
+            if len(data) == 0:
+                continue
+            samples.append((list(map(float, data[:-1])), data[-1]))
+    return samples
+
 def trainPerceptron(perceptron, dataSource, learningRateFunction, summary=True):
     """Trains a perceptron according to the data points in a data source.
     Each line should contain n whitespace-delimited inputs (where n is the
@@ -55,16 +225,21 @@ def trainPerceptron(perceptron, dataSource, learningRateFunction, summary=True):
         0.4 -1.2 5.2 1
     denotes a data point with features (0.4, -1.2, 5.2) in class 1. If summary
     is set to False, the session will not be summarized."""
-    t = 0
-    lines = dataSource.readlines()
+    samples = (line.split() for line in dataSource.readlines())
+    trainPerceptronOnSamples(perceptron, ((list(map(int, data[:-1])), data[-1])
+        for data in samples if len(data) > 0), learningRateFunction, summary)
+
+def trainPerceptronOnSamples(perceptron, samples, learningRateFunction,
+        summary=True, startTime=0):
+    """Trains a perceptron on an iterable of already parsed (inputs, label)
+    samples (see readDataFile). The learning rate clock starts after
+    startTime. Returns the time of the last sample and the number of updates
+    made."""
+    t = startTime
     numUpdates = 0
-    for line in lines:
-        line = line[:-1] if line[-1] == '\n' else line
+    for inputs, label in samples:
         t += 1
         learningRate = learningRateFunction(t)
-        data = line.split()
-        label = data[-1]
-        inputs = list(map(int, data[:-1]))
         prediction = perceptron.run(inputs)
         weights = perceptron.getWeights(perceptron.outputLayer[0])
         error = int(label) - int(prediction)
@@ -76,8 +251,9 @@ def trainPerceptron(perceptron, dataSource, learningRateFunction, summary=True):
             numUpdates += 1
         perceptron.setWeights(perceptron.outputLayer[0], newWeights)
     if summary:
-        print("Training complete: " + str(t) + " samples, "
+        print("Training complete: " + str(t - startTime) + " samples, "
             + str(numUpdates) + " updates.")
+    return (t, numUpdates)
 
 def computeNodeErrors(net, inputs, actualOutputs):
     """Computes the partial error of the network for each node. For a node n,
@@ -88,7 +264,7 @@ def computeNodeErrors(net, inputs, actualOutputs):
     squared error of the network on the data point."""
     errors = {}
     squareError = 0.0
-    label = net.run(inputs)
+    label = net.run(inputs, useCache=False)  # Node values are needed
     predictedOutputs = [1.0 if l == label else 0.0 for l in net.validLabels]
     for i, node in enumerate(net.outputLayer):
         errors[node] = predictedOutputs[i] - actualOutputs[i]
@@ -114,6 +290,8 @@ def computeNodeErrors(net, inputs, actualOutputs):
                 totalChildError += childError * weight
             if notComputable:
                 newToBeComputed.append(node)
+                if net.profiler is not None:
+                    net.profiler.recordRetry(node)
             else:
                 activationDerivative = DERIVATIVES[node.activationFunc]
                 if activationDerivative is None:
@@ -125,12 +303,17 @@ def computeNodeErrors(net, inputs, actualOutputs):
         toBeComputed = newToBeComputed
     return (errors, squareError)
 
-def backpropagation(net, inputs, actualOutputs, learningRate):
+def backpropagation(net, inputs, actualOutputs, learningRate, optimizer=None):
     """Performs backpropagation training for a single training sample. Returns
-    true if updates were made (i.e. if squareError is 0); false otherwise."""
+    true if updates were made (i.e. if squareError is 0); false otherwise. The
+    optimizer (see optimizers.py) computes each weight change from the
+    gradient; if none is given, plain gradient descent (SGDOptimizer) is
+    used."""
     nodeErrors, squareError = computeNodeErrors(net, inputs, actualOutputs)
     if squareError == 0.0:
         return False
+    if optimizer is None:
+        optimizer = SGDOptimizer()
     targetNodes = net.outputLayer[:]
     for layer in net.hiddenLayers:
         targetNodes += layer
@@ -138,34 +321,43 @@ def backpropagation(net, inputs, actualOutputs, learningRate):
         newWeights = []
         for parent in node.inputs:
             parentInput = parent.process(BYPASS)
-            weightChange = -1 * learningRate * parentInput * nodeErrors[node]
+            weightChange = optimizer.update((node, parent),
+                parentInput * nodeErrors[node], learningRate)
             currWeight = node.weights[parent]
             newWeights.append(currWeight + weightChange)
         net.setWeights(node, newWeights)
     return True
 
-def trainNetwork(net, dataSource, learningRateFunction, summary=True):
+def trainNetwork(net, dataSource, learningRateFunction, summary=True,
+        optimizer=None):
     """Uses backpropagation to train a network on several training samples."""
-    t = 0
-    lines = dataSource.readlines()
-    numUpdates = 0
     labels = net.validLabels
-    for line in lines:
-        line = line[:-1] if line[-1] == '\n' else line
+    samples = (parseSample(line, labels) for line in dataSource.readlines())
+    trainOnSamples(net, (s for s in samples if s is not None),
+        learningRateFunction, summary, optimizer)
+
+def trainOnSamples(net, samples, learningRateFunction, summary=True,
+        optimizer=None, startTime=0, progress=True):
+    """Uses backpropagation to train a network on an iterable of already parsed
+    (inputs, outputVector) samples (see dataPipeline.parseSample). The learning
+    rate clock starts after startTime. Progress is printed every 100 samples
+    unless progress is False. Returns the time of the last sample and the
+    number of updates made."""
+    t = startTime
+    numUpdates = 0
+    for inputs, outputVector in samples:
         t += 1
         learningRate = learningRateFunction(t)
-        rawData = line.split()
-        inputs = list(map(float, rawData[:-1]))
-        actualLabel = rawData[-1]
-        outputVector = [float(l == actualLabel) for l in labels]
-        if backpropagation(net, inputs, outputVector, learningRate):
+        if backpropagation(net, inputs, outputVector, learningRate,
+                optimizer):
             numUpdates += 1
-        if t % 100 == 0:
-            print(str(t) + ' training rounds performed; ' + str(numUpdates)
-                + ' updates so far.')
+        if progress and (t - startTime) % 100 == 0:
+            print(str(t - startTime) + ' training rounds performed; '
+                + str(numUpdates) + ' updates so far.')
     if summary:
-        print("Training complete: " + str(t) + " samples, "
+        print("Training complete: " + str(t - startTime) + " samples, "
             + str(numUpdates) + " updates.")
+    return (t, numUpdates)
 
 def validateNetwork(net, dataSource, summary=True):
     """Runs validation on a network given data from a source file. Each line
@@ -0,0 +1,36 @@
+from random import Random
+from math import sqrt
+
+"""Weight initialization schemes. Each of these functions returns a function
+which takes a node and returns a list of initial weights for it, ordered as
+its inputs (see Network.getWeights). Pass one to the Network constructor (or
+Network.fromFile) as weightInitialization. Seeding a scheme makes the initial
+weights reproducible; weights to the bias node always start at 0."""
+
+def zeroInitialization():
+    """Initializes every weight to 0, the default for new networks. Note that
+    this makes all hidden nodes in a fully connected layer identical."""
+    def function(node):
+        return [0.0] * len(node.inputs)
+    return function
+
+def uniformInitialization(scale=0.1, seed=None):
+    """Draws each weight uniformly at random from [-scale, scale]."""
+    generator = Random(seed)
+    def function(node):
+        return [0.0 if parent is node.bias else
+            generator.uniform(-scale, scale) for parent in node.inputs]
+    return function
+
+def xavierInitialization(seed=None):
+    """Draws each weight uniformly at random from [-r, r], where
+    r = sqrt(6 / (fanIn + fanOut)) for a node with fanIn parents and fanOut
+    children (output nodes count as having one child)."""
+    generator = Random(seed)
+    def function(node):
+        fanIn = len([p for p in node.inputs if p is not node.bias])
+        fanOut = max(len(node.children), 1)
+        limit = sqrt(6.0 / (fanIn + fanOut))
+        return [0.0 if parent is node.bias else
+            generator.uniform(-limit, limit) for parent in node.inputs]
+    return function